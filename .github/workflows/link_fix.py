@@ -2,30 +2,62 @@ from __future__ import annotations
 
 import os
 import re
+import sys
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from typing import Iterable
-from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+from typing import Iterable, Iterator
 
 repo = os.getenv("GITHUB_REPOSITORY")  # e.g., "fs-ise/handbook"
 sha = os.getenv("GITHUB_SHA")  # commit being checked
 server = os.getenv("GITHUB_SERVER_URL", "https://github.com")
 
+# Prefix for direct links to GitHub's editor in the broken-links report
+EDIT_URL_BASE = f"{server}/{repo}/edit/main/" if repo else None
+
 # Match inline markdown http(s) links (but NOT images):
 #   [text](http...)
 # optionally followed by an attribute block:
 #   { ... }
 #
 # The (?<!\!) prevents matching image syntax: ![alt](...)
+#
+# Quantifiers are possessive (++, *+; Python 3.11+) so a malformed link is
+# rejected without backtracking, and URLs may not span lines, so an unclosed
+# "(" cannot consume the rest of the file.
 MARKDOWN_HTTP_LINK_PATTERN = re.compile(
-    r"(?<!\!)\[(?P<text>[^\]]+)\]\((?P<url>http[^\)]+)\)(?P<attrs>\{[^}]*\})?"
+    r"(?<!\!)\[(?P<text>[^\]]++)\]\((?P<url>http[^\)\n]++)\)(?P<attrs>\{[^}]*+\})?"
 )
 
-# Match ANY inline markdown link (but NOT images):
+# Match inline markdown links that may point to internal pages (but NOT images):
 #   [text](dest)
-MARKDOWN_LINK_PATTERN = re.compile(r"(?<!\!)\[(?P<text>[^\]]+)\]\((?P<dest>[^)]+)\)")
+# The lookahead already rejects external/non-file destinations (http(s), mailto,
+# tel, #anchors) and Quarto shortcodes ({{< ... >}}, {{% ... %}}).
+MARKDOWN_INTERNAL_LINK_PATTERN = re.compile(
+    r"(?<!\!)\[(?P<text>[^\]]++)\]"
+    r"\((?P<dest>(?!\s*(?:https?://|mailto:|tel:|#|\{\{[<%]))[^)\n]++)\)"
+)
+
+# The same external/non-file prefixes, for destinations that only start with
+# one after utm_source=chatgpt.com is stripped ("?utm_source=...#anchor")
+NON_FILE_LINK_PREFIXES = ("http://", "https://", "mailto:", "tel:", "#")
+
+# Match a utm_source=chatgpt.com query parameter (plus its trailing "&", if any).
+# Only parameters directly after "?" or "&" count, so other values stay untouched.
+# Applied to the URL without its #fragment.
+UTM_SOURCE_CHATGPT_PATTERN = re.compile(r"(?<=[?&])utm_source=chatgpt\.com(?:&|$)")
+
+# Separators left dangling once the parameter is removed: extra "&" right after
+# "?" or "&" (e.g. "?&a=1", "a=1&&b=2"), and any "?"/"&" at the end
+DANGLING_QUERY_SEPARATOR_PATTERN = re.compile(r"(?<=[?&])&+|[?&]+$")
+
+# target="_blank" or target=_blank inside an attribute block
+TARGET_BLANK_PATTERN = re.compile(r'target\s*=\s*("_blank"|_blank)')
 
 SKIP_URL_SUBSTRINGS = ("img.shields.io",)
 
+# Internal link destinations that are not links (e.g., code in examples)
+IGNORED_INTERNAL_LINKS: frozenset[str] = frozenset({"{nc[k]}"})
+
 # Treat these as "assets", not pages (skip in internal-link checking;
 # also don't add target=_blank to external asset URLs).
 ASSET_SUFFIXES = (
@@ -38,19 +70,102 @@ ASSET_SUFFIXES = (
     ".pdf",
 )
 
+# Directories that never hold site sources (Quarto output/cache, vendored
+# extensions and packages); hidden directories (.git, .quarto) are skipped as well.
+SKIP_DIRS = frozenset({"_site", "_freeze", "_extensions", "node_modules"})
 
-def iter_content_files(root: Path) -> Iterable[Path]:
-    """Yield .md and .qmd files (skip root-level files)."""
-    for p in root.rglob("*"):
-        if not p.is_file():
-            continue
-        if p.suffix not in {".md", ".qmd"}:
-            continue
-        if len(p.relative_to(root).parts) == 1:
+# Use worker processes for the per-file pass from this many files on
+PARALLEL_MIN_FILES = 100
+
+# Per-run context for process_content_file (see init_worker)
+_repo_root: Path = Path.cwd()
+_known_sources: set[str] | None = None
+_symlinked_dirs: tuple[str, ...] = ()
+
+# Memoized Path.exists() results. The tree is static while the script runs,
+# so entries never need to be invalidated.
+_exists_cache: dict[str, bool] = {}
+
+
+def is_skipped_dir(name: str) -> bool:
+    """
+    True for hidden directories (.git, .quarto, ...), which Quarto does not render
+    either, and for SKIP_DIRS.
+    """
+    return name.startswith(".") or name in SKIP_DIRS
+
+
+def iter_source_files(root: Path, symlinked_dirs: list[str] | None = None) -> Iterable[Path]:
+    """
+    Yield every .md/.qmd file under root (including root-level files).
+    Uses a single os.scandir traversal and does not descend into skipped
+    directories (see is_skipped_dir) or symlinked directories (like rglob).
+    The symlinked directories are appended to symlinked_dirs (with a trailing
+    separator) if given, since the walk knows nothing about their contents.
+    """
+    stack = [str(root)]
+    while stack:
+        with os.scandir(stack.pop()) as it:
+            for entry in it:
+                if entry.is_dir(follow_symlinks=False):
+                    if not is_skipped_dir(entry.name):
+                        stack.append(entry.path)
+                elif entry.is_symlink() and entry.is_dir():
+                    if symlinked_dirs is not None:
+                        symlinked_dirs.append(entry.path + os.sep)
+                elif os.path.splitext(entry.name)[1] in {".md", ".qmd"} and entry.is_file():
+                    yield Path(entry.path)
+
+
+def iter_content_files(root: Path, sources: Iterable[Path]) -> Iterable[Path]:
+    """Yield the .md and .qmd files from sources (skip root-level files)."""
+    for p in sources:
+        if p.parent == root:
             continue
         yield p
 
 
+def _cached_exists(p: str) -> bool:
+    if p not in _exists_cache:
+        # Keys live for the whole run; intern them like the source index paths
+        _exists_cache[sys.intern(p)] = os.path.exists(p)
+    return _exists_cache[p]
+
+
+def is_indexed_path(p: str, root_prefix: str, symlinked_dirs: tuple[str, ...] = ()) -> bool:
+    """
+    True if p (normalized) lies in a directory iter_source_files walks,
+    i.e., under root_prefix and not inside a skipped or symlinked directory.
+    """
+    if not p.startswith(root_prefix) or p.startswith(symlinked_dirs):
+        return False
+    return not any(is_skipped_dir(d) for d in p[len(root_prefix) :].split(os.sep)[:-1])
+
+
+def source_exists(
+    p: str,
+    root_prefix: str,
+    known_sources: set[str] | None,
+    symlinked_dirs: tuple[str, ...] = (),
+) -> bool:
+    """
+    True if the candidate source file exists.
+    Paths the source index covers (see is_indexed_path; root_prefix is the repo
+    root plus a trailing separator) are answered from the index (no stat() call);
+    anything else, e.g. files in _extensions/ or in symlinked directories, falls back to a memoized
+    exists() check.
+    """
+    if os.sep + ".." in p:
+        # Leave ".." to the filesystem: folding it textually would also accept
+        # paths like nonexistent/../x that stat() does not find
+        return _cached_exists(p)
+
+    normalized = os.path.normpath(p)
+    if known_sources is not None and is_indexed_path(normalized, root_prefix, symlinked_dirs):
+        return normalized in known_sources
+    return _cached_exists(normalized)
+
+
 def strip_fragment_and_query(url: str) -> str:
     """Remove #fragment and ?query for suffix checks, keeping the path-ish portion."""
     return url.split("#", 1)[0].split("?", 1)[0].strip()
@@ -73,22 +188,18 @@ def should_skip_external(url: str) -> bool:
 def strip_chatgpt_utm(url: str) -> str:
     """
     Remove utm_source=chatgpt.com from URLs while preserving all other query params.
-    Works for absolute URLs and relative links alike.
+    Works for absolute URLs and relative links alike; the #fragment is left untouched.
     """
     if "utm_source=chatgpt.com" not in url:
         return url
 
-    parts = urlsplit(url)
-    query_pairs = parse_qsl(parts.query, keep_blank_values=True)
-
-    filtered = [
-        (k, v)
-        for (k, v) in query_pairs
-        if not (k == "utm_source" and v == "chatgpt.com")
-    ]
+    # Only the part before the first "#" holds the query
+    head, sep, fragment = url.partition("#")
+    if "utm_source=chatgpt.com" not in head:
+        return url
 
-    new_query = urlencode(filtered, doseq=True)
-    return urlunsplit((parts.scheme, parts.netloc, parts.path, new_query, parts.fragment))
+    stripped = UTM_SOURCE_CHATGPT_PATTERN.sub("", head)
+    return DANGLING_QUERY_SEPARATOR_PATTERN.sub("", stripped) + sep + fragment
 
 
 def attrs_already_have_target_blank(attrs: str) -> bool:
@@ -97,7 +208,7 @@ def attrs_already_have_target_blank(attrs: str) -> bool:
       - target="_blank"
       - target=_blank
     """
-    return bool(re.search(r'target\s*=\s*("_blank"|_blank)', attrs))
+    return bool(TARGET_BLANK_PATTERN.search(attrs))
 
 
 def normalize_to_brace_attrs(existing_attrs: str) -> str:
@@ -112,29 +223,32 @@ def normalize_to_brace_attrs(existing_attrs: str) -> str:
     return inner
 
 
-def append_target_blank_to_http_links(file_path: Path) -> bool:
+def append_target_blank_to_http_links(content: str) -> str:
     """Add {target=_blank} to http(s) links unless already present (any form)."""
-    content = file_path.read_text(encoding="utf-8")
 
     def add_target_blank(match: re.Match) -> str:
-        text = match.group("text")
-        url = match.group("url")
+        original_url = match.group("url")
         existing_attrs = match.group("attrs")  # {..} or {: ..} or None
 
-        url = strip_chatgpt_utm(url)
+        # strip_chatgpt_utm returns the same object if there is nothing to strip
+        url = strip_chatgpt_utm(original_url)
+
+        # Skipped URLs keep their attrs (if any) without target=_blank;
+        # attrs that already have target blank are kept exactly as-is.
+        keep_attrs = should_skip_external(url) or (
+            existing_attrs is not None and attrs_already_have_target_blank(existing_attrs)
+        )
+        if keep_attrs and url is original_url:
+            # Nothing to change: reuse the matched text instead of rebuilding it
+            return match.group(0)
 
         # Rebuild the [text](url) part with the cleaned URL
-        link = f"[{text}]({url})"
+        link = f"[{match.group('text')}]({url})"
 
-        if should_skip_external(url):
-            # Keep attrs if any, but do not add target=_blank
+        if keep_attrs:
             return link + (existing_attrs or "")
 
         if existing_attrs:
-            if attrs_already_have_target_blank(existing_attrs):
-                # Keep exactly as-is if it already has target blank
-                return link + existing_attrs
-
             inner = normalize_to_brace_attrs(existing_attrs)
             if inner:
                 return link + "{ " + inner + " target=_blank }"
@@ -142,20 +256,13 @@ def append_target_blank_to_http_links(file_path: Path) -> bool:
 
         return link + "{target=_blank}"
 
-    updated = MARKDOWN_HTTP_LINK_PATTERN.sub(add_target_blank, content)
-
-    if updated != content:
-        file_path.write_text(updated, encoding="utf-8")
-        print(f"Updated external links in {file_path}")
-        return True
-
-    print(f"No changes needed in {file_path}")
-    return False
+    return MARKDOWN_HTTP_LINK_PATTERN.sub(add_target_blank, content)
 
 
-def candidates_for_quarto_source(file_path: Path, link: str, repo_root: Path) -> list[Path]:
+def candidates_for_quarto_source(file_path: Path, link: str, repo_root: Path) -> list[str]:
     """
-    Given an internal link target, return plausible Quarto source candidates.
+    Given an internal link target, return plausible Quarto source candidates
+    (as path strings; they are only used for lookups, so no Path objects are built).
 
     Supports:
     - pretty URLs (no extension): foo/bar/baz
@@ -169,7 +276,7 @@ def candidates_for_quarto_source(file_path: Path, link: str, repo_root: Path) ->
     For directory links (ending with '/'), we check:
       - target/index.qmd / target/index.md
     """
-    clean = link.split("#", 1)[0].split("?", 1)[0].strip()
+    clean = strip_fragment_and_query(link)
 
     # Strip .html if present (old behavior)
     if clean.endswith(".html"):
@@ -183,92 +290,84 @@ def candidates_for_quarto_source(file_path: Path, link: str, repo_root: Path) ->
     # Resolve Quarto site-root paths
     if clean.startswith("/"):
         clean = clean.lstrip("/")
-        base = repo_root / clean
+        parent = os.fspath(repo_root)
     else:
-        base = file_path.parent / clean
+        parent = os.fspath(file_path.parent)
+    base = os.path.join(parent, clean) if clean else parent
 
     if is_dir:
         return [
-            base / "index.qmd",
-            base / "index.md",
+            base + "/index.qmd",
+            base + "/index.md",
         ]
 
     return [
-        Path(str(base) + ".qmd"),
-        Path(str(base) + ".md"),
-        base / "index.qmd",
-        base / "index.md",
+        base + ".qmd",
+        base + ".md",
+        base + "/index.qmd",
+        base + "/index.md",
     ]
 
 
-def is_templated_link(dest: str) -> bool:
-    d = dest.strip()
-    return d.startswith(("{{<", "{{%"))
-
-
-def check_internal_links(file_path: Path, repo_root: Path) -> list[tuple[str, list[Path]]]:
+def check_internal_links(
+    content: str,
+    file_path: Path,
+    repo_root: Path,
+    known_sources: set[str] | None = None,
+    symlinked_dirs: tuple[str, ...] = (),
+) -> list[tuple[str, list[str]]]:
     """
-    For each internal markdown link target, verify at least one plausible source exists.
+    For each internal markdown link target in content (read from file_path),
+    verify at least one plausible source exists.
     Returns list of (link, candidates) for broken ones.
+
+    known_sources (the set of all source files) lets existence checks skip the filesystem;
+    paths under symlinked_dirs (which the walk did not enter) are still checked on disk.
     """
-    content = file_path.read_text(encoding="utf-8")
-    broken: list[tuple[str, list[Path]]] = []
+    broken: list[tuple[str, list[str]]] = []
+    root_prefix = os.path.join(repo_root, "")
 
-    for m in MARKDOWN_LINK_PATTERN.finditer(content):
-        link = strip_chatgpt_utm(m.group("dest").strip())
+    # External, non-file and templated links never match the pattern
+    for m in MARKDOWN_INTERNAL_LINK_PATTERN.finditer(content):
+        dest = m.group("dest").strip()
+        link = strip_chatgpt_utm(dest)
 
-        if is_templated_link(link):
+        # Stripping can expose a prefix the pattern could not see
+        if link is not dest and link.startswith(NON_FILE_LINK_PREFIXES):
             continue
 
-        # Skip external and non-file links
-        if link.startswith(("http://", "https://", "mailto:", "#", "tel:")):
-            continue
-        if link in ["{nc[k]}"]:
-            continue
-
-        # Skip assets (png/jpg/etc.), shields, etc.
-        if any(s in link for s in SKIP_URL_SUBSTRINGS):
-            continue
-        if is_asset_link(link):
-            continue
-
-        # Keep your existing exception
-        if "_news" in link:
+        # Skip assets (png/jpg/etc.), shields, etc., known non-links,
+        # and keep your existing "_news" exception
+        if should_skip_external(link) or link in IGNORED_INTERNAL_LINKS or "_news" in link:
             continue
 
         cands = candidates_for_quarto_source(file_path, link, repo_root=repo_root)
-        if not any(p.exists() for p in cands):
+        if not any(source_exists(p, root_prefix, known_sources, symlinked_dirs) for p in cands):
             broken.append((link, cands))
 
     return broken
 
 
-def write_broken_links_report(
-    broken: dict[Path, list[tuple[str, list[Path]]]],
+def format_broken_links_section(
+    src_file: Path,
+    items: list[tuple[str, list[str]]],
     repo_root: Path,
-) -> None:
-    report_path = Path("broken_links.md")
-    if not broken:
-        if report_path.exists():
-            report_path.unlink()
-        print("No broken internal links found.")
-        return
-
-    with report_path.open("w", encoding="utf-8") as f:
-        for src_file, items in sorted(broken.items(), key=lambda x: str(x[0])):
-            rel = src_file.relative_to(repo_root).as_posix()
-
-            if repo:
-                # Direct link to GitHub's editor
-                edit_url = f"{server}/{repo}/edit/main/{rel}"
-                f.write(f"## In [{rel}]({edit_url})\n\n")
-            else:
-                f.write(f"## In `{rel}`\n\n")
+) -> str:
+    """Render the broken-links report section for one source file."""
+    rel = src_file.relative_to(repo_root).as_posix()
+
+    parts: list[str] = []
+    if EDIT_URL_BASE:
+        # Direct link to GitHub's editor
+        parts.append(f"## In [{rel}]({EDIT_URL_BASE}{rel})\n\n")
+    else:
+        parts.append(f"## In `{rel}`\n\n")
 
-            f.write("The following links are broken:")
-            for link, _cands in items:
-                f.write(f"\n```sh\n{link}\n```\n")
-            f.write("\n")
+    parts.append("The following links are broken:")
+    for link, _cands in items:
+        parts.append(f"\n```sh\n{link}\n```\n")
+    parts.append("\n")
+    return "".join(parts)
 
 
 def sort_lycheeignore_file(path: Path) -> bool:
@@ -282,7 +381,8 @@ def sort_lycheeignore_file(path: Path) -> bool:
     if not path.exists():
         return False
 
-    original = path.read_text(encoding="utf-8").splitlines()
+    before = path.read_text(encoding="utf-8")
+    original = before.splitlines()
 
     comments: list[str] = []
     entries: list[str] = []
@@ -296,27 +396,27 @@ def sort_lycheeignore_file(path: Path) -> bool:
         else:
             entries.append(s)
 
-    # Dedupe while preserving first-seen casing
+    # Dedupe while preserving first-seen casing; keep the lowercase key
+    # so sorting does not have to compute it again (keys are unique).
     seen_lower: set[str] = set()
-    deduped: list[str] = []
+    deduped: list[tuple[str, str]] = []
     for e in entries:
         key = e.lower()
         if key in seen_lower:
             continue
         seen_lower.add(key)
-        deduped.append(e)
+        deduped.append((key, e))
 
-    deduped_sorted = sorted(deduped, key=lambda x: x.lower())
+    deduped.sort()
 
     out_lines: list[str] = []
     if comments:
         out_lines.extend(comments)
         out_lines.append("")  # separator
 
-    out_lines.extend(deduped_sorted)
+    out_lines.extend(e for _key, e in deduped)
     out_text = "\n".join(out_lines).rstrip() + "\n"
 
-    before = path.read_text(encoding="utf-8")
     if before != out_text:
         path.write_text(out_text, encoding="utf-8")
         print(f"Sorted {path}")
@@ -326,23 +426,113 @@ def sort_lycheeignore_file(path: Path) -> bool:
     return False
 
 
+def init_worker(
+    repo_root: Path,
+    known_sources: set[str],
+    symlinked_dirs: tuple[str, ...] = (),
+) -> None:
+    """Store the per-run context process_content_file needs (once per worker process)."""
+    global _repo_root, _known_sources, _symlinked_dirs
+    _repo_root = repo_root
+    _known_sources = known_sources
+    _symlinked_dirs = symlinked_dirs
+
+
+def process_content_file(fp: Path) -> tuple[bool, list[tuple[str, list[str]]]]:
+    """
+    Read fp once, then:
+      1) add {target=_blank} to external links and remove ?utm_source=chatgpt.com
+         from those URLs (writing the file back only if it changed)
+      2) check internal links (pretty URLs, .html, etc.) against plausible Quarto
+         sources (ignoring utm_source=chatgpt.com when evaluating)
+    Returns (updated, broken links).
+    """
+    data = fp.read_bytes()
+
+    # Both link patterns need "](" (external links "](http"), so files
+    # without it are skipped before paying for the UTF-8 decode.
+    if b"](" not in data:
+        return False, []
+    content = data.decode("utf-8")
+
+    if b"](http" in data:
+        updated = append_target_blank_to_http_links(content)
+    else:
+        updated = content
+    # re.sub returns the very same object when nothing matched, so most
+    # unchanged files never get to the (length check +) full comparison.
+    # Matches whose replacement equals the original still need that comparison.
+    changed = updated is not content and updated != content
+    if changed:
+        fp.write_bytes(updated.encode("utf-8"))
+
+    broken = check_internal_links(
+        updated,
+        fp,
+        repo_root=_repo_root,
+        known_sources=_known_sources,
+        symlinked_dirs=_symlinked_dirs,
+    )
+    return changed, broken
+
+
+def process_content_files(
+    files: list[Path],
+    repo_root: Path,
+    known_sources: set[str],
+    symlinked_dirs: tuple[str, ...] = (),
+) -> Iterator[tuple[bool, list[tuple[str, list[str]]]]]:
+    """
+    Yield process_content_file results in the order of files.
+    Files are independent, so larger trees are spread over worker processes;
+    for small ones the pool start-up would cost more than it saves.
+    """
+    if len(files) >= PARALLEL_MIN_FILES:
+        with ProcessPoolExecutor(
+            initializer=init_worker, initargs=(repo_root, known_sources, symlinked_dirs)
+        ) as ex:
+            yield from ex.map(process_content_file, files, chunksize=16)
+    else:
+        init_worker(repo_root, known_sources, symlinked_dirs)
+        for fp in files:
+            yield process_content_file(fp)
+
+
 def main() -> None:
     root = Path.cwd()
 
-    # 1) Add {target=_blank} to external links in .md/.qmd (excluding root-level files)
-    #    and remove ?utm_source=chatgpt.com from those URLs
-    for fp in iter_content_files(root):
-        append_target_blank_to_http_links(fp)
+    symlinked_dirs: list[str] = []
+    sources = list(iter_source_files(root, symlinked_dirs))
+    # Interned: these strings are shared by every lookup for the whole run
+    known_sources = {sys.intern(os.fspath(p)) for p in sources}
+    files = list(iter_content_files(root, sources))
 
-    # 2) Check internal links (pretty URLs, .html, etc.) against plausible Quarto sources
-    #    (and ignore/remove utm_source=chatgpt.com when evaluating)
-    broken: dict[Path, list[tuple[str, list[Path]]]] = {}
-    for fp in iter_content_files(root):
-        b = check_internal_links(fp, repo_root=root)
-        if b:
-            broken[fp] = b
+    # Sorted once, so the report sections come out in file order
+    files.sort(key=os.fspath)
 
-    write_broken_links_report(broken, repo_root=root)
+    # 1) + 2) for each .md/.qmd file (excluding root-level files);
+    # broken internal links are written to the report as each file's result arrives.
+    results = process_content_files(files, root, known_sources, tuple(symlinked_dirs))
+    report_path = Path("broken_links.md")
+    has_broken = False
+    try:
+        with report_path.open("w", encoding="utf-8") as report:
+            for fp, (changed, broken) in zip(files, results):
+                if changed:
+                    print(f"Updated external links in {fp}")
+                else:
+                    print(f"No changes needed in {fp}")
+                if broken:
+                    report.write(format_broken_links_section(fp, broken, repo_root=root))
+                    has_broken = True
+    except BaseException:
+        # A partial report would be picked up by the workflow as a real one
+        report_path.unlink(missing_ok=True)
+        raise
+
+    if not has_broken:
+        report_path.unlink()
+        print("No broken internal links found.")
 
     # 3) Sort lychee ignore file alphabetically (remove duplicates)
     #    Lychee typically uses ".lycheeignore", but we handle "lycheeignore" too.